@@ -24,6 +24,7 @@ import discord
 import hondana
 import jishaku
 import mystbin
+import yarl
 from discord import app_commands
 from discord.ext import commands
 from discord.utils import MISSING, _ColourFormatter as ColourFormatter, stream_supports_colour
@@ -160,6 +161,7 @@ class Mipha(commands.Bot):
     pool: asyncpg.Pool
     user: discord.ClientUser
     session: aiohttp.ClientSession
+    duckling_session: aiohttp.ClientSession
     mb_client: mystbin.Client
     md_client: hondana.Client
     start_time: datetime.datetime
@@ -172,6 +174,8 @@ class Mipha(commands.Bot):
 
     __slots__ = (
         "session",
+        "duckling_session",
+        "duckling_url",
         "mb_client",
         "md_client",
         "start_time",
@@ -219,6 +223,12 @@ class Mipha(commands.Bot):
         self.owner_id: int | None = None
         self.owner_ids: Iterable[int] = self.config["owner_ids"]
 
+        # built once here rather than on every time conversion
+        duckling = self.config.get("duckling")
+        self.duckling_url: yarl.URL | None = None
+        if duckling and duckling["host"]:
+            self.duckling_url = yarl.URL.build(scheme="http", host=duckling["host"], port=duckling["port"], path="/parse")
+
     def run(self) -> None:
         raise NotImplementedError("Please use `.start()` instead.")
 
@@ -487,13 +497,17 @@ async def main() -> None:
     config = CONFIG_PATH.read_text("utf-8")
     raw_cfg: RootConfig = discord.utils._from_json(config)
 
-    async with Mipha(raw_cfg) as bot, aiohttp.ClientSession() as session, asyncpg.create_pool(
+    async with Mipha(raw_cfg) as bot, aiohttp.ClientSession() as session, aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit_per_host=32, keepalive_timeout=60)
+    ) as duckling_session, asyncpg.create_pool(
         dsn=bot.config["postgresql"]["dsn"], command_timeout=60, max_inactive_connection_lifetime=0, init=db_init
     ) as pool, LogHandler() as log_handler:
         bot.log_handler = log_handler
         bot.pool = pool
 
         bot.session = session
+        # application wide, kept separate so Duckling POSTs always reuse their keep-alive sockets
+        bot.duckling_session = duckling_session
 
         bot.mb_client = mystbin.Client(session=session, token=bot.config["tokens"]["mystbin"])
         bot.md_client = hondana.Client(
@@ -72,6 +72,9 @@ class CLDRDataEntry(NamedTuple):
 
 
 class TimezoneSource(SimpleListSource[tuple[str, datetime.timedelta]]):
+    # every render shows the current time, so pages can't be reused
+    cache_pages = False
+
     def format_page(self, _: RoboPages, entries: list[tuple[str, datetime.timedelta]]) -> discord.Embed:
         embed = discord.Embed(title="Dannyware Timezones!", colour=random_pastel_colour())
         tz_dict: collections.defaultdict[int, list[str]] = collections.defaultdict(list)
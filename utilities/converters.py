@@ -9,16 +9,33 @@ import logging
 import re
 import zoneinfo
 from typing import Any, Literal, Sequence, Type, TypedDict
+from urllib.parse import quote_plus
 
+import aiohttp
 import yarl
 from discord import app_commands
 from discord.ext import commands
+from discord.utils import _from_json
+from lru import LRU
 from typing_extensions import NotRequired, Self
 
 from utilities.context import Context, GuildContext, Interaction
 
 
-MYSTBIN_REGEX = re.compile(r"(?:(?:https?://)?(?:beta\.)?(?:mystb\.in\/))?(?P<id>(?:[A-Z]{1}[a-z]+)*)(?P<ext>\.\w+)?")
+MYSTBIN_REGEX = re.compile(r"(?:(?:https?://)?(?:beta\.)?mystb\.in/)?\b(?P<id>(?:[A-Z][a-z]+)+)(?P<ext>\.\w+)?")
+_MYSTBIN_SEARCH = MYSTBIN_REGEX.search
+_MYSTBIN_ID_MATCH = re.compile(r"(?:[A-Z][a-z]+)+").fullmatch
+_PREFIX_RE = re.compile(r"^me (?:to|in|at|that) ")
+_SUFFIX_RE = re.compile(r"\s*from now$")
+_WHAT_PREFIX_RE = re.compile(r"^to ")
+_LSTRIP_RE = re.compile(r"[ ,.!:;]*")
+_UTC = datetime.timezone.utc
+_TZ_CACHE: dict[str, zoneinfo.ZoneInfo] = {}
+# the static fields of the Duckling form body, pre-encoded so only the text needs encoding per request
+_DUCKLING_FORM = b"locale=en_US&dims=%5B%22time%22%2C+%22duration%22%5D"
+_DUCKLING_TZ_FORM: dict[str, bytes] = {}
+_DUCKLING_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+_DUCKLING_CACHE: LRU = LRU(1024)
 LOGGER = logging.getLogger(__name__)
 
 __all__ = (
@@ -42,6 +59,7 @@ class DucklingResponseValue(TypedDict):
     type: Literal["value"]
     unit: str
     value: NotRequired[str]
+    grain: NotRequired[str]
     minute: NotRequired[int]
     hour: NotRequired[int]
     second: NotRequired[int]
@@ -59,12 +77,70 @@ class DucklingResponse(TypedDict):
     value: DucklingResponseValue
 
 
+# (dim, value, start, end) where value is an ISO 8601 string for times and seconds for durations
+_DucklingCandidate = tuple[Literal["time", "duration"], Any, int, int]
+
+
 class MemeDict(dict):
-    def __getitem__(self, k: Sequence[Any]) -> Any:
+    """A dict keyed by sequences, looked up by any single element of a key."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._index: dict[Any, Sequence[Any]] | None = None
+
+    def _build_index(self) -> dict[Any, Sequence[Any]]:
+        index: dict[Any, Sequence[Any]] = {}
         for key in self:
-            if k in key:
-                return super().__getitem__(key)
-        raise KeyError(k)
+            for element in key:
+                # first key wins, to match the old linear scan
+                index.setdefault(element, key)
+
+        self._index = index
+        return index
+
+    # every mutation drops the index, it is rebuilt on the next lookup
+
+    def __setitem__(self, key: Sequence[Any], value: Any) -> None:
+        self._index = None
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key: Sequence[Any]) -> None:
+        self._index = None
+        super().__delitem__(key)
+
+    def __ior__(self, other: Any) -> Self:
+        self._index = None
+        return super().__ior__(other)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        self._index = None
+        super().update(*args, **kwargs)
+
+    def setdefault(self, key: Sequence[Any], default: Any = None) -> Any:
+        self._index = None
+        return super().setdefault(key, default)
+
+    def pop(self, key: Sequence[Any], *args: Any) -> Any:
+        self._index = None
+        return super().pop(key, *args)
+
+    def popitem(self) -> tuple[Sequence[Any], Any]:
+        self._index = None
+        return super().popitem()
+
+    def clear(self) -> None:
+        self._index = None
+        super().clear()
+
+    def __getitem__(self, k: Any) -> Any:
+        index = self._index
+        if index is None:
+            index = self._build_index()
+
+        try:
+            return super().__getitem__(index[k])
+        except (KeyError, TypeError):
+            raise KeyError(k) from None
 
 
 class RedditMediaURL:
@@ -72,10 +148,17 @@ class RedditMediaURL:
 
     def __init__(self, url: yarl.URL) -> None:
         self.url = url
-        self.filename = url.parts[1] + ".mp4"
+        self.filename = url.path.split("/", 2)[1] + ".mp4"
 
     @classmethod
     async def convert(cls: Type[Self], ctx: Context, argument: str) -> Self:
+        # cheap checks before paying for a full URL parse, which normalises the case of the scheme and host
+        lowered = argument.lower()
+        if not lowered.startswith(("https://", "http://")):
+            raise commands.BadArgument("Not a valid URL.")
+        if "redd" not in lowered:
+            raise commands.BadArgument("Not a reddit URL.")
+
         try:
             url = yarl.URL(argument)
         except Exception:
@@ -91,7 +174,7 @@ class RedditMediaURL:
         if url.host is None:
             raise commands.BadArgument("Not a valid v.reddit url.")
 
-        is_valid_path = url.host.endswith(".reddit.com") and cls.VALID_PATH.match(url.path)
+        is_valid_path = url.host.endswith(".reddit.com") and _REDDIT_PATH_MATCH(url.path)
         if not is_valid_path:
             raise commands.BadArgument("Not a reddit URL.")
 
@@ -124,16 +207,97 @@ class RedditMediaURL:
             return cls(fallback_url)
 
 
+_REDDIT_PATH_MATCH = RedditMediaURL.VALID_PATH.match
+
+
+def _skip_punctuation(text: str, pos: int, /) -> int:
+    match = _LSTRIP_RE.match(text, pos)
+    # the pattern matches the empty string, so this only narrows the type
+    assert match is not None
+    return match.end()
+
+
+def _resolve_timezone(key: str | None) -> datetime.tzinfo:
+    if not key:
+        return _UTC
+
+    try:
+        return _TZ_CACHE[key]
+    except KeyError:
+        tz = _TZ_CACHE[key] = zoneinfo.ZoneInfo(key)
+        return tz
+
+
+async def _duckling_parse(
+    session: aiohttp.ClientSession,
+    url: yarl.URL,
+    argument: str,
+    timezone: datetime.tzinfo,
+    /,
+    *,
+    now: datetime.datetime | None = None,
+) -> list[tuple[datetime.datetime, int, int]]:
+    # durations are real elapsed time, adding them to a local time would be off by an hour across a DST change
+    now = now.astimezone(_UTC) if now else datetime.datetime.now(_UTC)
+
+    if timezone is _UTC:
+        tz_key = "UTC"
+    else:
+        # ZoneInfo keeps its name as `key`, anything else has to be formatted
+        tz_key = getattr(timezone, "key", None) or str(timezone)
+    # Duckling resolves times against its own clock, so answers are only reused within the same minute
+    cache_key = (argument, tz_key, int(now.timestamp()) // 60)
+    try:
+        candidates: list[_DucklingCandidate] = _DUCKLING_CACHE[cache_key]
+    except KeyError:
+        try:
+            tz_form = _DUCKLING_TZ_FORM[tz_key]
+        except KeyError:
+            tz_form = _DUCKLING_TZ_FORM[tz_key] = b"&tz=" + quote_plus(tz_key).encode()
+
+        body = _DUCKLING_FORM + tz_form + b"&text=" + quote_plus(argument).encode()
+
+        async with session.post(url, data=body, headers=_DUCKLING_HEADERS) as response:
+            data: list[DucklingResponse] = _from_json(await response.read())
+            status = response.status
+
+        # only keep the fields we read, the rest of the payload is dropped straight away
+        candidates = []
+        cacheable = status == 200
+        for time in data:
+            if time["dim"] == "time" and "value" in time["value"]:
+                candidates.append(("time", time["value"]["value"], time["start"], time["end"]))
+                # "in 30 seconds" comes back as an absolute second-grain time, which would be stale on a later hit
+                if time["value"].get("grain") in ("second", "minute"):
+                    cacheable = False
+            elif time["dim"] == "duration":
+                candidates.append(("duration", time["value"]["normalized"]["value"], time["start"], time["end"]))
+
+        if cacheable:
+            _DUCKLING_CACHE[cache_key] = candidates
+
+    fromisoformat = datetime.datetime.fromisoformat
+    timedelta = datetime.timedelta
+    if len(candidates) == 1:
+        # by far the most common response, so skip the loop
+        dim, value, start, end = candidates[0]
+        return [(fromisoformat(value) if dim == "time" else now + timedelta(seconds=value), start, end)]
+
+    times: list[tuple[datetime.datetime, int, int]] = []
+    for dim, value, start, end in candidates:
+        if dim == "time":
+            times.append((fromisoformat(value), start, end))
+        else:
+            times.append((now + timedelta(seconds=value), start, end))
+
+    return times
+
+
 class DatetimeConverter(commands.Converter[datetime.datetime]):
     @staticmethod
-    async def get_timezone(ctx: Context) -> zoneinfo.ZoneInfo | None:
+    async def get_timezone(ctx: Context) -> datetime.tzinfo:
         row: str | None = await ctx.bot.pool.fetchval("SELECT tz FROM tz_store WHERE user_id = $1;", ctx.author.id)
-        if row:
-            tz = zoneinfo.ZoneInfo(row)
-        else:
-            tz = zoneinfo.ZoneInfo("UTC")
-
-        return tz
+        return _resolve_timezone(row)
 
     @classmethod
     async def parse(
@@ -146,53 +310,17 @@ class DatetimeConverter(commands.Converter[datetime.datetime]):
         now: datetime.datetime | None = None,
         duckling_url: yarl.URL,
     ) -> list[tuple[datetime.datetime, int, int]]:
-        now = now or datetime.datetime.now(datetime.timezone.utc)
-
-        times: list[tuple[datetime.datetime, int, int]] = []
-
-        async with ctx.bot.session.post(
-            duckling_url,
-            data={
-                "locale": "en_US",
-                "text": argument,
-                "dims": '["time", "duration"]',
-                "tz": str(timezone),
-            },
-        ) as response:
-            data: list[DucklingResponse] = await response.json()
-
-            for time in data:
-                if time["dim"] == "time" and "value" in time["value"]:
-                    times.append(
-                        (
-                            datetime.datetime.fromisoformat(time["value"]["value"]),
-                            time["start"],
-                            time["end"],
-                        )
-                    )
-                elif time["dim"] == "duration":
-                    times.append(
-                        (
-                            datetime.datetime.now(datetime.timezone.utc)
-                            + datetime.timedelta(seconds=time["value"]["normalized"]["value"]),
-                            time["start"],
-                            time["end"],
-                        )
-                    )
-
-        return times
+        return await _duckling_parse(ctx.bot.duckling_session, duckling_url, argument, timezone or _UTC, now=now)
 
     @classmethod
     async def convert(cls, ctx: Context, argument: str) -> datetime.datetime:
         timezone = await cls.get_timezone(ctx)
         now = ctx.message.created_at.astimezone(tz=timezone)
 
-        duckling_key = ctx.bot.config.get("duckling")
-        if not duckling_key:
+        duckling_url = ctx.bot.duckling_url
+        if duckling_url is None:
             raise RuntimeError("No Duckling instance available to perform this action.")
 
-        duckling_url = yarl.URL.build(scheme="http", host=duckling_key["host"], port=duckling_key["port"], path="/parse")
-
         parsed_times = await cls.parse(argument, ctx=ctx, timezone=timezone, now=now, duckling_url=duckling_url)
 
         if len(parsed_times) == 0:
@@ -210,23 +338,13 @@ class WhenAndWhatConverter(commands.Converter[tuple[datetime.datetime, str]]):
         now = ctx.message.created_at.astimezone(tz=timezone)
 
         # Strip some common stuff
-        for prefix in ("me to ", "me in ", "me at ", "me that "):
-            if argument.startswith(prefix):
-                argument = argument[len(prefix) :]
-                break
-
-        for suffix in ("from now",):
-            if argument.endswith(suffix):
-                argument = argument[: -len(suffix)]
-
-        argument = argument.strip()
+        argument = _PREFIX_RE.sub("", argument, count=1)
+        argument = _SUFFIX_RE.sub("", argument, count=1).strip()
 
-        duckling_key = ctx.bot.config.get("duckling")
-        if not duckling_key:
+        duckling_url = ctx.bot.duckling_url
+        if duckling_url is None:
             raise RuntimeError("No Duckling instance available to perform this action.")
 
-        duckling_url = yarl.URL.build(scheme="http", host=duckling_key["host"], port=duckling_key["port"], path="/parse")
-
         # Determine the date argument
         parsed_times = await DatetimeConverter.parse(
             argument, ctx=ctx, timezone=timezone, now=now, duckling_url=duckling_url
@@ -243,13 +361,11 @@ class WhenAndWhatConverter(commands.Converter[tuple[datetime.datetime, str]]):
             raise commands.BadArgument("Could not distinguish time from argument.")
 
         if begin == 0:
-            what = argument[end + 1 :].lstrip(" ,.!:;")
+            what = argument[_skip_punctuation(argument, end + 1) :]
         else:
             what = argument[:begin].strip()
 
-        for prefix in ("to ",):
-            if what.startswith(prefix):
-                what = what[len(prefix) :]
+        what = _WHAT_PREFIX_RE.sub("", what, count=1)
 
         return (when, what or "…")
 
@@ -260,16 +376,11 @@ class BadDatetimeTransform(app_commands.AppCommandError):
 
 class DatetimeTransformer(app_commands.Transformer):
     @staticmethod
-    async def get_timezone(interaction: Interaction) -> zoneinfo.ZoneInfo | None:
+    async def get_timezone(interaction: Interaction) -> datetime.tzinfo:
         row: str | None = await interaction.client.pool.fetchval(
             "SELECT tz FROM tz_store WHERE user_id = $1;", interaction.user.id
         )
-        if row:
-            tz = zoneinfo.ZoneInfo(row)
-        else:
-            tz = zoneinfo.ZoneInfo("UTC")
-
-        return tz
+        return _resolve_timezone(row)
 
     @classmethod
     async def parse(
@@ -282,53 +393,17 @@ class DatetimeTransformer(app_commands.Transformer):
         now: datetime.datetime | None = None,
         duckling_url: yarl.URL,
     ) -> list[tuple[datetime.datetime, int, int]]:
-        now = now or datetime.datetime.now(datetime.timezone.utc)
-
-        times: list[tuple[datetime.datetime, int, int]] = []
-
-        async with interaction.client.session.post(
-            duckling_url,
-            data={
-                "locale": "en_US",
-                "text": argument,
-                "dims": '["time", "duration"]',
-                "tz": str(timezone),
-            },
-        ) as response:
-            data: list[DucklingResponse] = await response.json()
-
-            for time in data:
-                if time["dim"] == "time" and "value" in time["value"]:
-                    times.append(
-                        (
-                            datetime.datetime.fromisoformat(time["value"]["value"]),
-                            time["start"],
-                            time["end"],
-                        )
-                    )
-                elif time["dim"] == "duration":
-                    times.append(
-                        (
-                            datetime.datetime.now(datetime.timezone.utc)
-                            + datetime.timedelta(seconds=time["value"]["normalized"]["value"]),
-                            time["start"],
-                            time["end"],
-                        )
-                    )
-
-        return times
+        return await _duckling_parse(interaction.client.duckling_session, duckling_url, argument, timezone or _UTC, now=now)
 
     @classmethod
     async def transform(cls, interaction: Interaction, argument: str) -> datetime.datetime:
         timezone = await cls.get_timezone(interaction)
         now = interaction.created_at.astimezone(tz=timezone)
 
-        duckling_key = interaction.client.config.get("duckling")
-        if not duckling_key:
+        duckling_url = interaction.client.duckling_url
+        if duckling_url is None:
             raise RuntimeError("No Duckling instance available to perform this action.")
 
-        duckling_url = yarl.URL.build(scheme="http", host=duckling_key["host"], port=duckling_key["port"], path="/parse")
-
         parsed_times = await cls.parse(
             argument, interaction=interaction, timezone=timezone, now=now, duckling_url=duckling_url
         )
@@ -343,20 +418,15 @@ class DatetimeTransformer(app_commands.Transformer):
 
 class WhenAndWhatTransformer(app_commands.Transformer):
     @staticmethod
-    async def get_timezone(interaction: Interaction) -> zoneinfo.ZoneInfo | None:
+    async def get_timezone(interaction: Interaction) -> datetime.tzinfo:
         if interaction.guild is None:
-            tz = zoneinfo.ZoneInfo("UTC")
-        else:
-            row: str | None = await interaction.client.pool.fetchval(
-                "SELECT tz FROM tz_store WHERE user_id = $1;",
-                interaction.user.id,
-            )
-            if row:
-                tz = zoneinfo.ZoneInfo(row)
-            else:
-                tz = zoneinfo.ZoneInfo("UTC")
+            return _UTC
 
-        return tz
+        row: str | None = await interaction.client.pool.fetchval(
+            "SELECT tz FROM tz_store WHERE user_id = $1;",
+            interaction.user.id,
+        )
+        return _resolve_timezone(row)
 
     @classmethod
     async def parse(
@@ -369,41 +439,7 @@ class WhenAndWhatTransformer(app_commands.Transformer):
         now: datetime.datetime | None = None,
         duckling_url: yarl.URL,
     ) -> list[tuple[datetime.datetime, int, int]]:
-        now = now or datetime.datetime.now(datetime.timezone.utc)
-
-        times: list[tuple[datetime.datetime, int, int]] = []
-
-        async with interaction.client.session.post(
-            duckling_url,
-            data={
-                "locale": "en_US",
-                "text": argument,
-                "dims": '["time", "duration"]',
-                "tz": str(timezone),
-            },
-        ) as response:
-            data: list[DucklingResponse] = await response.json()
-
-            for time in data:
-                if time["dim"] == "time" and "value" in time["value"]:
-                    times.append(
-                        (
-                            datetime.datetime.fromisoformat(time["value"]["value"]),
-                            time["start"],
-                            time["end"],
-                        )
-                    )
-                elif time["dim"] == "duration":
-                    times.append(
-                        (
-                            datetime.datetime.now(datetime.timezone.utc)
-                            + datetime.timedelta(seconds=time["value"]["normalized"]["value"]),
-                            time["start"],
-                            time["end"],
-                        )
-                    )
-
-        return times
+        return await _duckling_parse(interaction.client.duckling_session, duckling_url, argument, timezone or _UTC, now=now)
 
     @classmethod
     async def transform(cls, interaction: Interaction, value: str) -> datetime.datetime:
@@ -411,23 +447,13 @@ class WhenAndWhatTransformer(app_commands.Transformer):
         now = interaction.created_at.astimezone(tz=timezone)
 
         # Strip some common stuff
-        for prefix in ("me to ", "me in ", "me at ", "me that "):
-            if value.startswith(prefix):
-                value = value[len(prefix) :]
-                break
+        value = _PREFIX_RE.sub("", value, count=1)
+        value = _SUFFIX_RE.sub("", value, count=1).strip()
 
-        for suffix in ("from now",):
-            if value.endswith(suffix):
-                value = value[: -len(suffix)]
-
-        value = value.strip()
-
-        duckling_key = interaction.client.config.get("duckling")
-        if not duckling_key:
+        duckling_url = interaction.client.duckling_url
+        if duckling_url is None:
             raise RuntimeError("No Duckling instance available to perform this action.")
 
-        duckling_url = yarl.URL.build(scheme="http", host=duckling_key["host"], port=duckling_key["port"], path="/parse")
-
         parsed_times = await cls.parse(value, interaction=interaction, timezone=timezone, now=now, duckling_url=duckling_url)
 
         if len(parsed_times) == 0:
@@ -441,13 +467,11 @@ class WhenAndWhatTransformer(app_commands.Transformer):
             raise BadDatetimeTransform("Could not distinguish time from argument.")
 
         if begin == 0:
-            what = value[end + 1 :].lstrip(" ,.!:;")
+            what = value[_skip_punctuation(value, end + 1) :]
         else:
             what = value[:begin].strip()
 
-        for prefix in ("to ",):
-            if what.startswith(prefix):
-                what = what[len(prefix) :]
+        what = _WHAT_PREFIX_RE.sub("", what, count=1)
 
         return when
 
@@ -468,7 +492,14 @@ class Snowflake:
 
 class MystbinPasteConverter(commands.Converter[str]):
     async def convert(self, ctx: GuildContext, argument: str) -> str:
-        matches = MYSTBIN_REGEX.search(argument)
+        # the common cases are a bare ID or a single paste URL, which don't need the regex
+        head, _, candidate = argument.rpartition("mystb.in/")
+        paste_id, _, _ = candidate.partition(".")
+        # the regex takes the first ID in the text, so only shortcut when nothing before this one could be an ID
+        if head == head.lower() and _MYSTBIN_ID_MATCH(paste_id):
+            return paste_id
+
+        matches = _MYSTBIN_SEARCH(argument)
         if not matches:
             raise commands.ConversionError(self, ValueError("No Mystbin IDs found in this text."))
 
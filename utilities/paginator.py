@@ -6,14 +6,17 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 from __future__ import annotations
 
+import asyncio
+import inspect
+from collections import OrderedDict
 from collections.abc import Sequence
+from functools import lru_cache
 from textwrap import shorten
-from typing import Any, Generic, Type, TypeVar, overload
+from typing import Any, Callable, ClassVar, Generic, Type, TypeVar, overload
 
 import discord
 import hondana
 from discord.ext import menus
-from discord.ext.commands import Paginator as CommandPaginator
 from typing_extensions import Self
 
 from utilities.context import Context, Interaction
@@ -25,16 +28,33 @@ SourceT = TypeVar("SourceT", bound="menus.PageSource")
 RoboPagesT = TypeVar("RoboPagesT", bound="RoboPages")
 SimplePagesT = TypeVar("SimplePagesT", bound="SimplePages")
 
+_COLOUR_BLURPLE = discord.Colour.blurple()
+_COLOUR_RED = discord.Colour.red()
+_COLOUR_BLUE = discord.Colour.blue()
+
+# how each kind of `format_page` return value becomes message kwargs
+_PAGE_KWARGS: dict[type, Callable[[Any], dict[str, Any]]] = {
+    dict: lambda value: value,
+    str: lambda value: {"content": value, "embed": None},
+    discord.Embed: lambda value: {"embed": value, "content": None},
+}
+
+
+@lru_cache(maxsize=128)
+def _modal_config(max_pages: int) -> tuple[str, int]:
+    as_string = str(max_pages)
+    return f"Enter a number between 1 and {as_string}", len(as_string)
+
 
 class NumberedPageModal(discord.ui.Modal, title="Go to page"):
     page = discord.ui.TextInput[Self](label="Page", placeholder="Enter a number", min_length=1)
 
+    __slots__ = ("interaction",)
+
     def __init__(self, max_pages: int | None) -> None:
         super().__init__()
         if max_pages is not None:
-            as_string = str(max_pages)
-            self.page.placeholder = f"Enter a number between 1 and {as_string}"
-            self.page.max_length = len(as_string)
+            self.page.placeholder, self.page.max_length = _modal_config(max_pages)
 
     async def on_submit(self, interaction: Interaction) -> None:
         self.interaction = interaction
@@ -42,6 +62,43 @@ class NumberedPageModal(discord.ui.Modal, title="Go to page"):
 
 
 class RoboPages(MiphaBaseView):
+    KWARGS_CACHE_SIZE: ClassVar[int] = 8
+    MAX_PRECOMPUTED_LABELS: ClassVar[int] = 1000
+    # (compact, use_last_and_first) -> buttons to show, in order
+    _BUTTON_LAYOUTS: ClassVar[dict[tuple[bool, bool], tuple[str, ...]]] = {
+        (False, True): (
+            "go_to_first_page",
+            "go_to_previous_page",
+            "go_to_current_page",
+            "go_to_next_page",
+            "go_to_last_page",
+            "numbered_page",
+            "stop_pages",
+        ),
+        (False, False): ("go_to_previous_page", "go_to_current_page", "go_to_next_page", "numbered_page", "stop_pages"),
+        (True, True): ("go_to_first_page", "go_to_previous_page", "go_to_next_page", "go_to_last_page", "stop_pages"),
+        (True, False): ("go_to_previous_page", "go_to_next_page", "stop_pages"),
+    }
+
+    __slots__ = (
+        "source",
+        "check_embeds",
+        "ctx",
+        "message",
+        "current_page",
+        "compact",
+        "_allowed_ids",
+        "_kwargs_cache",
+        "_cache_pages",
+        "_needs_prepare",
+        "_max_pages",
+        "_page_labels",
+        "_nav_sem",
+        "_edit_lock",
+        "_nav_seq",
+        "_format_page_is_coro",
+    )
+
     def __init__(
         self,
         source: menus.PageSource,
@@ -54,95 +111,173 @@ class RoboPages(MiphaBaseView):
         self.source: menus.PageSource = source
         self.check_embeds: bool = check_embeds
         self.ctx: Context = ctx
+        self._allowed_ids: frozenset[int] = frozenset(filter(None, (ctx.bot.owner_id, ctx.author.id)))
         self.message: discord.Message | None = None
         self.current_page: int = 0
         self.compact: bool = compact
+        self._kwargs_cache: OrderedDict[int, dict[str, Any]] = OrderedDict()
+        # rendered pages are reused, sources whose `format_page` isn't pure (e.g. shows the time) set `cache_pages = False`
+        self._cache_pages: bool = getattr(source, "cache_pages", True)
+        # the base `prepare` does nothing, so there is nothing to wait for unless a source overrides it
+        self._needs_prepare: bool = type(source).prepare is not menus.PageSource.prepare
+        self._max_pages: int | None = source.get_max_pages()
+        self._page_labels: list[str] | None = None
+        self._nav_sem: asyncio.Semaphore = asyncio.Semaphore(2)
+        self._edit_lock: asyncio.Lock = asyncio.Lock()
+        self._nav_seq: int = 0
+        self._format_page_is_coro: bool = inspect.iscoroutinefunction(source.format_page)
         self.clear_items()
         self.fill_items()
 
     def fill_items(self) -> None:
         if not self.compact:
-            self.numbered_page.row = 1
+            # `numbered_page` is on row 1 by default as it's never shown in compact mode
             self.stop_pages.row = 1
 
         if self.source.is_paginating():
-            max_pages = self.source.get_max_pages()
+            max_pages = self._max_pages
             use_last_and_first = max_pages is not None and max_pages >= 2
-            if use_last_and_first:
-                self.add_item(self.go_to_first_page)
-            self.add_item(self.go_to_previous_page)
-            if not self.compact:
-                self.add_item(self.go_to_current_page)
-            self.add_item(self.go_to_next_page)
-            if use_last_and_first:
-                self.add_item(self.go_to_last_page)
-            if not self.compact:
-                self.add_item(self.numbered_page)
-            self.add_item(self.stop_pages)
+            for name in self._BUTTON_LAYOUTS[self.compact, use_last_and_first]:
+                self.add_item(getattr(self, name))
 
     async def _get_kwargs_from_page(self, page: int) -> dict[str, Any]:
-        value = await discord.utils.maybe_coroutine(self.source.format_page, self, page)
-        if isinstance(value, dict):
-            return value
-        elif isinstance(value, str):
-            return {"content": value, "embed": None}
-        elif isinstance(value, discord.Embed):
-            return {"embed": value, "content": None}
+        if self._format_page_is_coro:
+            value = await self.source.format_page(self, page)
         else:
+            value = self.source.format_page(self, page)
+
+        try:
+            return _PAGE_KWARGS[type(value)](value)
+        except KeyError:
+            # subclasses, e.g. MangaDexEmbed
+            for type_, to_kwargs in _PAGE_KWARGS.items():
+                if isinstance(value, type_):
+                    return to_kwargs(value)
             return {}
 
     async def show_page(self, interaction: Interaction, page_number: int) -> None:
-        page = await self.source.get_page(page_number)
-        self.current_page = page_number
-        kwargs = await self._get_kwargs_from_page(page)
-        self._update_labels(page_number)
-        if kwargs:
-            if interaction.response.is_done():
-                if self.message:
-                    await self.message.edit(**kwargs, view=self)
+        self._nav_seq += 1
+        seq = self._nav_seq
+
+        # acknowledge straight away, page sources may take longer than the interaction deadline to render
+        deferred = not interaction.response.is_done()
+        if deferred:
+            await interaction.response.defer()
+
+        async with self._nav_sem:
+            # a newer click supersedes this one, so don't render a page nobody wants any more
+            if seq != self._nav_seq:
+                return
+
+            try:
+                kwargs = self._kwargs_cache[page_number]
+            except KeyError:
+                page = await self.source.get_page(page_number)
+                if seq != self._nav_seq:
+                    return
+
+                self.current_page = page_number
+                kwargs = await self._get_kwargs_from_page(page)
+                # a superseded render may have read another page's `current_page`, so it must not be cached
+                if seq != self._nav_seq:
+                    return
+
+                self._cache_kwargs(page_number, kwargs)
             else:
-                await interaction.response.edit_message(**kwargs, view=self)
+                self._kwargs_cache.move_to_end(page_number)
+                self.current_page = page_number
+
+            # renders can overlap but edits can't, so an older edit never lands after a newer one
+            async with self._edit_lock:
+                if seq != self._nav_seq:
+                    return
+
+                self._update_labels(page_number)
+                if kwargs:
+                    if deferred:
+                        await interaction.edit_original_response(**kwargs, view=self)
+                    elif self.message:
+                        await self.message.edit(**kwargs, view=self)
+
+    def invalidate_max_pages(self) -> None:
+        """re-read the page count, for sources whose entries change while paginating"""
+        self._max_pages = self.source.get_max_pages()
+        self._build_page_labels()
+        self._kwargs_cache.clear()
+
+    def _build_page_labels(self) -> None:
+        max_pages = self._max_pages
+        if max_pages is not None and max_pages <= self.MAX_PRECOMPUTED_LABELS:
+            # covers every label _update_labels can ask for, up to `max_pages + 1`
+            self._page_labels = [str(number) for number in range(max_pages + 2)]
+        else:
+            self._page_labels = None
+
+    def _cache_kwargs(self, page_number: int, kwargs: dict[str, Any]) -> None:
+        if not self._cache_pages:
+            return
+
+        if not kwargs or "file" in kwargs or "files" in kwargs or "attachments" in kwargs:
+            # files are consumed when sent, so these pages have to be rendered every time
+            return
+
+        self._kwargs_cache[page_number] = kwargs
+        if len(self._kwargs_cache) > self.KWARGS_CACHE_SIZE:
+            self._kwargs_cache.popitem(last=False)
 
     def _update_labels(self, page_number: int) -> None:
         self.go_to_first_page.disabled = page_number == 0
         if self.compact:
-            max_pages = self.source.get_max_pages()
-            self.go_to_last_page.disabled = max_pages is None or (page_number + 1) >= max_pages
-            self.go_to_next_page.disabled = max_pages is not None and (page_number + 1) >= max_pages
+            max_pages = self._max_pages
+            at_end = max_pages is not None and (page_number + 1) >= max_pages
+            self.go_to_last_page.disabled = max_pages is None or at_end
+            self.go_to_next_page.disabled = at_end
             self.go_to_previous_page.disabled = page_number == 0
             return
 
-        self.go_to_current_page.label = str(page_number + 1)
-        self.go_to_previous_page.label = str(page_number)
-        self.go_to_next_page.label = str(page_number + 2)
+        labels = self._page_labels
+        if labels is not None:
+            self.go_to_current_page.label = labels[page_number + 1]
+            self.go_to_previous_page.label = labels[page_number]
+            self.go_to_next_page.label = labels[page_number + 2]
+        else:
+            self.go_to_current_page.label = str(page_number + 1)
+            self.go_to_previous_page.label = str(page_number)
+            self.go_to_next_page.label = str(page_number + 2)
         self.go_to_next_page.disabled = False
         self.go_to_previous_page.disabled = False
         self.go_to_first_page.disabled = False
 
-        max_pages = self.source.get_max_pages()
+        max_pages = self._max_pages
         if max_pages is not None:
-            self.go_to_last_page.disabled = (page_number + 1) >= max_pages
-            if (page_number + 1) >= max_pages:
+            at_end = (page_number + 1) >= max_pages
+            self.go_to_last_page.disabled = at_end
+            if at_end:
                 self.go_to_next_page.disabled = True
                 self.go_to_next_page.label = "…"
             if page_number == 0:
                 self.go_to_previous_page.disabled = True
                 self.go_to_previous_page.label = "…"
 
-    async def show_checked_page(self, interaction: Interaction, page_number: int) -> None:
-        max_pages = self.source.get_max_pages()
+    async def show_checked_page(self, interaction: Interaction, page_number: int) -> bool:
+        """returns whether the page exists, the interaction may already be deferred even when it doesn't"""
+        max_pages = self._max_pages
         try:
             if max_pages is None:
                 # If it doesn't give maximum pages, it cannot be checked
                 await self.show_page(interaction, page_number)
+                return True
             elif max_pages > page_number >= 0:
                 await self.show_page(interaction, page_number)
+                return True
         except IndexError:
             # An error happened that can be handled, so ignore it.
             pass
 
+        return False
+
     async def interaction_check(self, interaction: Interaction) -> bool:
-        if interaction.user and interaction.user.id in (self.ctx.bot.owner_id, self.ctx.author.id):
+        if interaction.user and interaction.user.id in self._allowed_ids:
             return True
         await interaction.response.send_message("This pagination menu cannot be controlled by you, sorry!", ephemeral=True)
         return False
@@ -162,11 +297,17 @@ class RoboPages(MiphaBaseView):
             await self.ctx.send("Bot does not have embed links permission in this channel.", ephemeral=True)
             return
 
-        await self.source._prepare_once()
+        if self._needs_prepare:
+            await self.source._prepare_once()
+        self._max_pages = self.source.get_max_pages()
+        self._build_page_labels()
+        self._kwargs_cache.clear()
         page = await self.source.get_page(0)
         kwargs = await self._get_kwargs_from_page(page)
+        self._cache_kwargs(0, kwargs)
         if content:
-            kwargs.setdefault("content", content)
+            # a new dict, the start-up content belongs to this message only and not to the cached page
+            kwargs = {"content": content, **kwargs}
 
         self._update_labels(0)
         self.message = await self.ctx.send(**kwargs, view=self, ephemeral=ephemeral)
@@ -194,15 +335,15 @@ class RoboPages(MiphaBaseView):
     async def go_to_last_page(self, interaction: Interaction, button: discord.ui.Button) -> None:
         """go to the last page"""
         # The call here is safe because it's guarded by skip_if
-        await self.show_page(interaction, self.source.get_max_pages() - 1)  # type: ignore
+        await self.show_page(interaction, self._max_pages - 1)  # type: ignore
 
-    @discord.ui.button(label="Skip to page...", style=discord.ButtonStyle.grey)
+    @discord.ui.button(label="Skip to page...", style=discord.ButtonStyle.grey, row=1)
     async def numbered_page(self, interaction: Interaction, button: discord.ui.Button) -> None:
         """lets you type a page number to go to"""
         if self.message is None:
             return
 
-        modal = NumberedPageModal(self.source.get_max_pages())
+        modal = NumberedPageModal(self._max_pages)
         await interaction.response.send_modal(modal)
         timed_out = await modal.wait()
 
@@ -213,16 +354,19 @@ class RoboPages(MiphaBaseView):
             await modal.interaction.response.send_message("Took too long", ephemeral=True)
             return
 
-        value = str(modal.page.value)
-        if not value.isdigit():
-            await modal.interaction.response.send_message(f"Expected a number not {value!r}", ephemeral=True)
+        try:
+            value = int(modal.page.value)
+        except (TypeError, ValueError):
+            await modal.interaction.response.send_message(f"Expected a number not {modal.page.value!r}", ephemeral=True)
             return
 
-        value = int(value)
-        await self.show_checked_page(modal.interaction, value - 1)
-        if not modal.interaction.response.is_done():
+        # out of range numbers, negative ones included, are rejected by the bounds check
+        if not await self.show_checked_page(modal.interaction, value - 1):
             error = modal.page.placeholder.replace("Enter", "Expected")  # type: ignore # Can't be None
-            await modal.interaction.response.send_message(error, ephemeral=True)
+            if modal.interaction.response.is_done():
+                await modal.interaction.followup.send(error, ephemeral=True)
+            else:
+                await modal.interaction.response.send_message(error, ephemeral=True)
 
     @discord.ui.button(label="Quit", style=discord.ButtonStyle.red)
     async def stop_pages(self, interaction: Interaction, button: discord.ui.Button) -> None:
@@ -235,6 +379,8 @@ class RoboPages(MiphaBaseView):
 class FieldPageSource(menus.ListPageSource, Generic[RoboPagesT]):
     """A page source that requires (field_name, field_value) tuple items."""
 
+    __slots__ = ("embed", "clear_description", "inline")
+
     def __init__(
         self,
         entries: list[tuple[Any, Any]],
@@ -244,33 +390,68 @@ class FieldPageSource(menus.ListPageSource, Generic[RoboPagesT]):
         clear_description: bool = True,
     ) -> None:
         super().__init__(entries, per_page=per_page)
-        self.embed: discord.Embed = discord.Embed(colour=discord.Colour.blurple())
+        self.embed: discord.Embed = discord.Embed(colour=_COLOUR_BLURPLE)
         self.clear_description: bool = clear_description
         self.inline: bool = inline
 
     async def format_page(self, menu: RoboPagesT, entries: list[tuple[Any, Any]]) -> discord.Embed:
-        self.embed.clear_fields()
+        # `self.embed` is only a template, every page gets its own copy
+        embed = self.embed.copy()
         if self.clear_description:
-            self.embed.description = None
+            embed.description = None
 
         for key, value in entries:
-            self.embed.add_field(name=key, value=value, inline=self.inline)
+            embed.add_field(name=key, value=value, inline=self.inline)
 
         maximum = self.get_max_pages()
         if maximum > 1:
             text = f"Page {menu.current_page + 1}/{maximum} ({len(self.entries)} entries)"
-            self.embed.set_footer(text=text)
+            embed.set_footer(text=text)
+
+        return embed
+
+
+def _paginate_text(text: str, *, prefix: str | None, suffix: str | None, max_size: int) -> list[str]:
+    """Split ``text`` on line boundaries into pages of at most ``max_size`` characters,
+    each wrapped in ``prefix`` and ``suffix``. Produces the same pages as ``commands.Paginator``.
+    """
+    # like `Paginator`, an empty affix still gets its separating newline and only `None` means no affix
+    head = "" if prefix is None else f"{prefix}\n"
+    tail = "" if suffix is None else f"\n{suffix}"
+    line_limit = max_size - len(prefix or "") - len(suffix or "") - 2
+    # `Paginator` counts a separator after every line, including the last one on the page
+    budget = max_size - len(head) - len(suffix or "") - 1
+
+    pages: list[str] = []
+    length = len(text)
+    start = pos = 0
+    while True:
+        end = text.find("\n", pos)
+        if end == -1:
+            end = length
+
+        if end - pos > line_limit:
+            raise RuntimeError(f"Line exceeds maximum page size {line_limit}")
+
+        if end - start > budget:
+            # this line doesn't fit, so close the page before it
+            pages.append(head + text[start : pos - 1] + tail)
+            start = pos
 
-        return self.embed
+        if end == length:
+            break
+        pos = end + 1
+
+    pages.append(head + text[start:] + tail)
+    return pages
 
 
 class TextPageSource(menus.ListPageSource, Generic[RoboPagesT]):
-    def __init__(self, text, *, prefix="```", suffix="```", max_size=2000) -> None:
-        pages = CommandPaginator(prefix=prefix, suffix=suffix, max_size=max_size - 200)
-        for line in text.split("\n"):
-            pages.add_line(line)
+    __slots__ = ()
 
-        super().__init__(entries=pages.pages, per_page=1)
+    def __init__(self, text, *, prefix="```", suffix="```", max_size=2000) -> None:
+        pages = _paginate_text(text, prefix=prefix, suffix=suffix, max_size=max_size - 200)
+        super().__init__(entries=pages, per_page=1)
 
     async def format_page(self, menu: RoboPagesT, content: str) -> str:
         maximum = self.get_max_pages()
@@ -280,18 +461,22 @@ class TextPageSource(menus.ListPageSource, Generic[RoboPagesT]):
 
 
 class SimplePageSource(menus.ListPageSource, Generic[SimplePagesT]):
-    async def format_page(self, menu: SimplePagesT, entries: Sequence[Any]) -> discord.Embed:
-        pages = []
-        for index, entry in enumerate(entries, start=menu.current_page * self.per_page):
-            pages.append(f"{index + 1}. {entry}")
+    __slots__ = ("_footer",)
 
+    def __init__(self, entries: Sequence[Any], *, per_page: int) -> None:
+        super().__init__(entries, per_page=per_page)
         maximum = self.get_max_pages()
-        if maximum > 1:
-            footer = f"Page {menu.current_page + 1}/{maximum} ({len(self.entries)} entries)"
-            menu.embed.set_footer(text=footer)
+        # only the page number changes between pages
+        self._footer: str | None = f"Page {{}}/{maximum} ({len(entries)} entries)" if maximum > 1 else None
+
+    async def format_page(self, menu: SimplePagesT, entries: Sequence[Any]) -> discord.Embed:
+        start = menu.current_page * self.per_page
+        embed = menu.embed.copy()
+        if self._footer is not None:
+            embed.set_footer(text=self._footer.format(menu.current_page + 1))
 
-        menu.embed.description = "\n".join(pages)
-        return menu.embed
+        embed.description = "\n".join(f"{start + index}. {entry}" for index, entry in enumerate(entries, start=1))
+        return embed
 
 
 class SimplePages(RoboPages):
@@ -302,10 +487,13 @@ class SimplePages(RoboPages):
 
     def __init__(self, entries, *, ctx: Context, per_page: int = 12) -> None:
         super().__init__(SimplePageSource(entries, per_page=per_page), ctx=ctx)
-        self.embed = discord.Embed(colour=discord.Colour.blurple())
+        # template for every page, copied rather than mutated by the source
+        self.embed = discord.Embed(colour=_COLOUR_BLURPLE)
 
 
 class SimpleListSource(menus.ListPageSource, Generic[T]):
+    __slots__ = ("data",)
+
     def __init__(self, data: list[T], per_page: int = 1) -> None:
         self.data = data
         super().__init__(data, per_page=per_page)
@@ -337,15 +525,13 @@ class MangaDexEmbed(discord.Embed):
         if parent.cover_url() is None:
             await parent.get_cover()
 
-        self = cls(title=parent_title, colour=discord.Colour.red(), url=chapter.url)
+        self = cls(title=parent_title, colour=_COLOUR_RED, url=chapter.url)
         self.set_footer(text=chapter.id)
         self.timestamp = chapter.created_at
         self.add_field(name="Manga link is:", value=f"[here!]({parent.url})", inline=False)
         self.add_field(name="Number of pages:", value=chapter.pages, inline=False)
-        if chapter.scanlator_groups:
-            self.add_field(
-                name="Scanlator groups:", value="\n".join([s.name for s in chapter.scanlator_groups]), inline=False
-            )
+        if chapter.scanlator_groups and (groups := "\n".join(s.name for s in chapter.scanlator_groups)):
+            self.add_field(name="Scanlator groups:", value=groups, inline=False)
         if chapter.uploader:
             self.add_field(name="Uploader:", value=chapter.uploader.username, inline=False)
 
@@ -356,19 +542,19 @@ class MangaDexEmbed(discord.Embed):
 
     @classmethod
     async def from_manga(cls: Type[Self], manga: hondana.Manga, *, nsfw_allowed: bool = False) -> Self:
-        self = cls(title=manga.title, colour=discord.Colour.blue(), url=manga.url)
+        self = cls(title=manga.title, colour=_COLOUR_BLUE, url=manga.url)
         if manga.description:
             self.description = shorten(manga.description, width=2000)
-        if manga.tags:
-            self.add_field(name="Tags:", value=", ".join([tag.name for tag in manga.tags]), inline=False)
+        if manga.tags and (tags := ", ".join(tag.name for tag in manga.tags)):
+            self.add_field(name="Tags:", value=tags, inline=False)
         if manga.publication_demographic:
             self.add_field(name="Publication Demographic:", value=str(manga.publication_demographic).title())
         if manga.content_rating:
             self.add_field(name="Content Rating:", value=str(manga.content_rating).title(), inline=False)
-        if manga.artists:
-            self.add_field(name="Attributed Artists:", value=", ".join([artist.name for artist in manga.artists]))
-        if manga.authors:
-            self.add_field(name="Attributed Authors:", value=", ".join([artist.name for artist in manga.authors]))
+        if manga.artists and (artists := ", ".join(artist.name for artist in manga.artists)):
+            self.add_field(name="Attributed Artists:", value=artists)
+        if manga.authors and (authors := ", ".join(author.name for author in manga.authors)):
+            self.add_field(name="Attributed Authors:", value=authors)
         if manga.status:
             self.add_field(name="Publication status:", value=str(manga.status).title(), inline=False)
             if manga.status is hondana.MangaStatus.completed: